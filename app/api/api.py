@@ -4,6 +4,7 @@ from klein import Klein
 from twisted.internet.defer import inlineCallbacks
 from twisted.web.http import BAD_REQUEST, NOT_FOUND, INTERNAL_SERVER_ERROR, CONFLICT
 
+from app.api.middleware import READ, TEMPLATE, WRITE, throttle
 from app.services.exceptions import VersionNotFoundError, ServiceNotFoundError
 from app.services.service import ConfigService, IConfigService
 
@@ -34,6 +35,18 @@ def _get_query_params(request) -> Dict[str, Any]:
     return params
 
 
+def _read_kind(request) -> str:
+    values = request.args.get(b"template")
+    if not values:
+        return READ
+    if len(values) > 1:
+        return TEMPLATE
+    value = values[0].decode("utf-8", "replace").lower()
+    if value.isdecimal():
+        return TEMPLATE if int(value) else READ
+    return READ if value in ("", "false") else TEMPLATE
+
+
 @app.route("/", methods=["GET"])
 def root(request):
     request.setHeader(b"Content-Type", b"application/json")
@@ -50,6 +63,7 @@ def root(request):
 
 
 @app.route("/config/<string:service>", methods=["POST"])
+@throttle(WRITE)
 @inlineCallbacks
 def upload_config(request, service: str):
     request.setHeader(b"Content-Type", b"application/json")
@@ -68,6 +82,7 @@ def upload_config(request, service: str):
 
 
 @app.route("/config/<string:service>", methods=["GET"])
+@throttle(_read_kind)
 @inlineCallbacks
 def get_config(request, service: str):
     request.setHeader(b"Content-Type", b"application/json")
@@ -101,6 +116,7 @@ def get_config(request, service: str):
         return _json_response({"error": "Internal server error"}, INTERNAL_SERVER_ERROR)
 
 @app.route("/config/<string:service>/history", methods=["GET"])
+@throttle(READ)
 @inlineCallbacks
 def get_config_history(request, service: str):
     request.setHeader(b"Content-Type", b"application/json")
@@ -0,0 +1,165 @@
+import json
+import math
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+
+from twisted.internet import reactor
+from twisted.internet.interfaces import IReactorTime
+from twisted.web.http import SERVICE_UNAVAILABLE
+
+from app.repo.connections import db_manager
+from app.settings import settings
+
+READ = "read"
+TEMPLATE = "template"
+WRITE = "write"
+
+TOO_MANY_REQUESTS = 429
+
+_STATUS_MESSAGES = {
+    TOO_MANY_REQUESTS: b"Too Many Requests",
+    SERVICE_UNAVAILABLE: b"Service Unavailable",
+}
+
+
+class TokenBucket:
+    """Токен-бакет: `rate` токенов в секунду, не более `burst` в запасе."""
+
+    def __init__(self, rate: float, burst: int, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(float(self.burst), self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def consume(self, now: float) -> bool:
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def retry_after(self) -> int:
+        """Сколько секунд ждать до появления следующего токена."""
+        return max(1, math.ceil((1.0 - self.tokens) / self.rate))
+
+
+class RateLimiter:
+    """Набор токен-бакетов по ключу (клиент, тип запроса).
+
+    Хранит не более `max_buckets` бакетов (по одному на пару клиент/тип),
+    вытесняя давно не использованные.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[float, int]],
+        clock: IReactorTime = reactor,
+        max_buckets: int = 30000,
+    ) -> None:
+        for kind, (rate, burst) in limits.items():
+            if rate <= 0 or burst < 1:
+                raise ValueError(f"Invalid rate limit for '{kind}': rate={rate}, burst={burst}")
+        self.limits = limits
+        self.clock = clock
+        if max_buckets < 1:
+            raise ValueError(f"Invalid bucket limit: max_buckets={max_buckets}")
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[tuple, TokenBucket]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def check(self, client: str, kind: str) -> Optional[int]:
+        """Списать токен. Возвращает None, если запрос разрешён, иначе Retry-After."""
+        now = self.clock.seconds()
+        key = (client, kind)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate, burst = self.limits[kind]
+            bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        if bucket.consume(now):
+            return None
+        return bucket.retry_after()
+
+
+class AdmissionController:
+    """Отклоняет запросы, когда очередь работы с БД превышает `max_pending`."""
+
+    def __init__(
+        self, pending: Callable[[], int], max_pending: int, retry_after: int = 1
+    ) -> None:
+        if max_pending < 1:
+            raise ValueError(f"Invalid admission limit: max_pending={max_pending}")
+        self.pending = pending
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+
+    def overloaded(self) -> bool:
+        return self.pending() > self.max_pending
+
+
+rate_limiter = RateLimiter(
+    {
+        READ: (settings.rate_limit_read_rate, settings.rate_limit_read_burst),
+        TEMPLATE: (settings.rate_limit_template_rate, settings.rate_limit_template_burst),
+        WRITE: (settings.rate_limit_write_rate, settings.rate_limit_write_burst),
+    },
+    max_buckets=settings.rate_limit_max_buckets,
+)
+admission = AdmissionController(
+    lambda: db_manager.pending, settings.admission_max_pending, settings.admission_retry_after
+)
+
+
+def _client_key(request, trusted_sources: Iterable[str] = settings.rate_limit_trusted_sources) -> str:
+    # X-Client-Id принимается только от доверенных адресов (например, прокси),
+    # иначе клиент обходит лимит, меняя идентификатор в каждом запросе.
+    host = request.getClientAddress().host
+    client_id = request.getHeader(b"X-Client-Id")
+    if client_id and host in trusted_sources:
+        return "id:" + client_id.decode("utf-8", "replace")
+    return "ip:" + host
+
+
+def _reject(request, status: int, retry_after: int, message: str) -> bytes:
+    request.setResponseCode(status, _STATUS_MESSAGES[status])
+    request.setHeader(b"Content-Type", b"application/json")
+    request.setHeader(b"Retry-After", str(retry_after).encode("ascii"))
+    return json.dumps({"error": message}, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def throttle(kind: Union[str, Callable[..., str]]):
+    """Обёртка над обработчиком Klein: rate limit по клиенту и контроль перегрузки.
+
+    `kind` — тип бюджета (READ, TEMPLATE, WRITE) или функция от request,
+    возвращающая его.
+    """
+
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(request, *args, **kwargs):
+            # Сначала глобальная проверка перегрузки, чтобы отклонённые 503
+            # запросы не расходовали токены клиента.
+            if admission.overloaded():
+                return _reject(
+                    request, SERVICE_UNAVAILABLE, admission.retry_after, "Service overloaded"
+                )
+            budget = kind(request) if callable(kind) else kind
+            retry_after = rate_limiter.check(_client_key(request), budget)
+            if retry_after is not None:
+                return _reject(request, TOO_MANY_REQUESTS, retry_after, "Rate limit exceeded")
+            return handler(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
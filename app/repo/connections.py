@@ -3,7 +3,7 @@ import psycopg2
 import psycopg2.extras
 
 from typing import List, Optional, Dict, Any, Protocol
-from twisted.internet import defer, threads
+from twisted.internet import defer, reactor, threads
 
 from app.services.exceptions import DatabaseError, VersionNotFoundError, ServiceNotFoundError
 from app.repo.models import Configuration, ConfigurationHistory
@@ -11,6 +11,8 @@ from app.settings import settings
 
 
 class IDatabaseManager(Protocol):
+    pending: int
+
     def save_configuration(self, service: str, payload: Dict[str, Any]) -> int:
         ...
 
@@ -21,6 +23,28 @@ class IDatabaseManager(Protocol):
         ...
 
 class DatabaseManager(IDatabaseManager):
+    def __init__(self) -> None:
+        self.pending = 0
+
+    def _defer_to_thread(self, func) -> defer.Deferred:
+        """Выполнить func в пуле потоков, учитывая её в `pending` до фактического завершения.
+
+        Отмена Deferred не останавливает поток, поэтому счётчик уменьшается
+        из самого потока, а не по колбэку.
+        """
+
+        def _run():
+            try:
+                return func()
+            finally:
+                reactor.callFromThread(self._work_done)
+
+        self.pending += 1
+        return threads.deferToThread(_run)
+
+    def _work_done(self) -> None:
+        self.pending -= 1
+
     def _get_connection(self):
         """Получить соединение с базой данных."""
         try:
@@ -66,7 +90,7 @@ class DatabaseManager(IDatabaseManager):
                 conn.close()
 
         try:
-            version = yield threads.deferToThread(_save_in_thread)
+            version = yield self._defer_to_thread(_save_in_thread)
             defer.returnValue(version)
         except psycopg2.IntegrityError:
             raise DatabaseError(f"Configuration version {payload.get('version')} already exists for service {service}")
@@ -120,7 +144,7 @@ class DatabaseManager(IDatabaseManager):
                 conn.close()
 
         try:
-            config = yield threads.deferToThread(_get_in_thread)
+            config = yield self._defer_to_thread(_get_in_thread)
             defer.returnValue(config)
         except psycopg2.Error as e:
             raise DatabaseError(f"Failed to get configuration: {e}")
@@ -158,7 +182,7 @@ class DatabaseManager(IDatabaseManager):
                 conn.close()
 
         try:
-            history = yield threads.deferToThread(_get_history_in_thread)
+            history = yield self._defer_to_thread(_get_history_in_thread)
             defer.returnValue(history)
         except psycopg2.Error as e:
             raise DatabaseError(f"Failed to get configuration history: {e}")
@@ -15,5 +15,20 @@ class Settings:
     http_host: str = os.getenv("HTTP_HOST", "localhost")
     http_port: int = int(os.getenv("HTTP_PORT", "8080"))
 
+    rate_limit_read_rate: float = float(os.getenv("RATE_LIMIT_READ_RATE", "20"))
+    rate_limit_read_burst: int = int(os.getenv("RATE_LIMIT_READ_BURST", "40"))
+    rate_limit_template_rate: float = float(os.getenv("RATE_LIMIT_TEMPLATE_RATE", "5"))
+    rate_limit_template_burst: int = int(os.getenv("RATE_LIMIT_TEMPLATE_BURST", "10"))
+    rate_limit_write_rate: float = float(os.getenv("RATE_LIMIT_WRITE_RATE", "2"))
+    rate_limit_write_burst: int = int(os.getenv("RATE_LIMIT_WRITE_BURST", "5"))
+
+    rate_limit_max_buckets: int = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "30000"))
+    rate_limit_trusted_sources: tuple = tuple(
+        s.strip() for s in os.getenv("RATE_LIMIT_TRUSTED_SOURCES", "").split(",") if s.strip()
+    )
+
+    admission_max_pending: int = int(os.getenv("ADMISSION_MAX_PENDING", "50"))
+    admission_retry_after: int = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
 settings = Settings()
 
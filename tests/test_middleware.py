@@ -0,0 +1,285 @@
+import json
+from io import BytesIO
+
+import pytest
+from twisted.internet import defer
+from twisted.internet.address import IPv4Address
+from twisted.internet.task import Clock
+from twisted.web.test.requesthelper import DummyRequest
+
+from app.api import api, middleware
+from app.api.middleware import AdmissionController, RateLimiter, READ, TEMPLATE, WRITE
+from app.repo import connections
+from app.repo.connections import DatabaseManager
+
+
+class StubConfigService:
+    def __init__(self):
+        self.calls = []
+        self.error = None
+
+    def _result(self, value):
+        return defer.fail(self.error) if self.error else defer.succeed(value)
+
+    def create_configuration(self, service, yaml_content):
+        self.calls.append("create")
+        return self._result({"service": service, "version": 1, "status": "saved"})
+
+    def get_configuration(self, service, version=None, template=False, template_vars=None):
+        self.calls.append("get")
+        return self._result({"key": "value"})
+
+    def get_configuration_history(self, service):
+        self.calls.append("history")
+        return self._result([])
+
+
+def _result(d):
+    results = []
+    d.addBoth(results.append)
+    assert results, "Deferred has not fired"
+    return results[0]
+
+
+def _request(args=None, headers=None):
+    request = DummyRequest([b"config", b"svc"])
+    request.client = IPv4Address("TCP", "127.0.0.1", 12345)
+    request.args = args or {}
+    for name, value in (headers or {}).items():
+        request.requestHeaders.setRawHeaders(name, [value])
+    return request
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def limiter(clock):
+    return RateLimiter({READ: (10, 2), WRITE: (0.5, 1)}, clock=clock)
+
+
+@pytest.fixture
+def db_pending():
+    return {"count": 0}
+
+
+@pytest.fixture
+def service(monkeypatch, clock, db_pending):
+    stub = StubConfigService()
+    monkeypatch.setattr(api, "config_service", stub)
+    monkeypatch.setattr(
+        middleware,
+        "rate_limiter",
+        RateLimiter({READ: (10, 2), TEMPLATE: (1, 1), WRITE: (0.5, 1)}, clock=clock),
+    )
+    monkeypatch.setattr(
+        middleware, "admission", AdmissionController(lambda: db_pending["count"], 2, 3)
+    )
+    return stub
+
+
+def test_rate_limiter_allows_burst_then_rejects(limiter):
+    assert limiter.check("ip:127.0.0.1", READ) is None
+    assert limiter.check("ip:127.0.0.1", READ) is None
+    assert limiter.check("ip:127.0.0.1", READ) == 1
+
+
+def test_rate_limiter_refills_over_time(limiter, clock):
+    assert limiter.check("ip:127.0.0.1", WRITE) is None
+    assert limiter.check("ip:127.0.0.1", WRITE) == 2
+    clock.advance(2)
+    assert limiter.check("ip:127.0.0.1", WRITE) is None
+
+
+def test_rate_limiter_budgets_are_separate(limiter):
+    assert limiter.check("ip:127.0.0.1", WRITE) is None
+    assert limiter.check("ip:127.0.0.1", WRITE) is not None
+    assert limiter.check("ip:127.0.0.1", READ) is None
+    assert limiter.check("ip:10.0.0.2", WRITE) is None
+
+
+def test_rate_limiter_evicts_least_recently_used(clock):
+    limiter = RateLimiter({READ: (1, 1)}, clock=clock, max_buckets=2)
+    limiter.check("a", READ)
+    limiter.check("b", READ)
+    limiter.check("a", READ)
+    limiter.check("c", READ)
+    assert len(limiter) == 2
+    # "a" использовался недавно и остался пустым, "b" вытеснен и получил новый бакет.
+    assert limiter.check("a", READ) is not None
+    assert limiter.check("b", READ) is None
+
+
+@pytest.mark.parametrize("rate, burst", [(0, 5), (-1, 5), (1, 0)])
+def test_rate_limiter_rejects_invalid_limits(rate, burst):
+    with pytest.raises(ValueError):
+        RateLimiter({READ: (rate, burst)})
+
+
+def test_rate_limiter_rejects_invalid_bucket_limit():
+    with pytest.raises(ValueError):
+        RateLimiter({READ: (1, 1)}, max_buckets=0)
+
+
+def test_admission_controller_sheds_above_limit():
+    pending = {"count": 2}
+    admission = AdmissionController(lambda: pending["count"], 2)
+    assert not admission.overloaded()
+    pending["count"] = 3
+    assert admission.overloaded()
+
+
+def test_admission_controller_rejects_invalid_limit():
+    with pytest.raises(ValueError):
+        AdmissionController(lambda: 0, 0)
+
+
+def test_client_key_ignores_untrusted_client_id():
+    request = _request(headers={b"X-Client-Id": b"agent-1"})
+    assert middleware._client_key(request, trusted_sources=()) == "ip:127.0.0.1"
+    assert middleware._client_key(request, trusted_sources=("127.0.0.1",)) == "id:agent-1"
+
+
+def test_rotating_client_ids_share_ip_budget(service):
+    statuses = []
+    for i in range(3):
+        request = _request(headers={b"X-Client-Id": f"agent-{i}".encode()})
+        request.content = BytesIO(b"key: value")
+        result = api.upload_config(request, "svc")
+        if i == 0:
+            _result(result)
+        statuses.append(request.responseCode)
+    assert statuses == [201, 429, 429]
+
+
+def test_rate_limited_request_returns_429(service):
+    request = _request()
+    request.content = BytesIO(b"key: value")
+    _result(api.upload_config(request, "svc"))
+
+    request = _request()
+    body = api.upload_config(request, "svc")
+
+    assert request.responseCode == 429
+    assert request.responseMessage == b"Too Many Requests"
+    assert request.responseHeaders.getRawHeaders(b"Retry-After") == [b"2"]
+    assert json.loads(body) == {"error": "Rate limit exceeded"}
+    assert service.calls == ["create"]
+
+
+def test_template_reads_use_template_budget(service):
+    request = _request(args={b"template": [b"1"]})
+    request.content = BytesIO(b"")
+    assert _result(api.get_config(request, "svc"))
+    request = _request(args={b"template": [b"1"]})
+    api.get_config(request, "svc")
+    assert request.responseCode == 429
+
+    request = _request()
+    assert json.loads(_result(api.get_config(request, "svc"))) == {"key": "value"}
+
+
+@pytest.mark.parametrize(
+    "args, kind",
+    [
+        ({}, READ),
+        ({b"template": [b"1"]}, TEMPLATE),
+        ({b"template": [b"true"]}, TEMPLATE),
+        ({b"template": [b"0"]}, READ),
+        ({b"template": [b"false"]}, READ),
+        ({b"template": [b"\xff"]}, TEMPLATE),
+        ({b"template": [b"1"], b"x": [b"\xff"]}, TEMPLATE),
+    ],
+)
+def test_read_kind(args, kind):
+    assert api._read_kind(_request(args=args)) == kind
+
+
+def test_overloaded_db_returns_503(service, db_pending):
+    db_pending["count"] = 3
+    request = _request()
+    body = api.get_config_history(request, "svc")
+
+    assert request.responseCode == 503
+    assert request.responseMessage == b"Service Unavailable"
+    assert request.responseHeaders.getRawHeaders(b"Retry-After") == [b"3"]
+    assert json.loads(body) == {"error": "Service overloaded"}
+    assert service.calls == []
+
+
+def test_overload_does_not_consume_rate_limit(service, db_pending):
+    db_pending["count"] = 3
+    for _ in range(3):
+        request = _request()
+        api.upload_config(request, "svc")
+        assert request.responseCode == 503
+
+    db_pending["count"] = 0
+    request = _request()
+    request.content = BytesIO(b"key: value")
+    _result(api.upload_config(request, "svc"))
+    assert request.responseCode == 201
+
+
+def test_failed_handler_does_not_hold_admission(service):
+    service.error = RuntimeError("boom")
+    request = _request()
+    _result(api.get_config_history(request, "svc"))
+    assert request.responseCode == 500
+
+    service.error = None
+    request = _request()
+    assert json.loads(_result(api.get_config_history(request, "svc"))) == []
+    assert request.responseCode != 503
+
+
+def test_db_pending_held_until_thread_finishes(monkeypatch):
+    jobs = []
+
+    class FakeThreads:
+        @staticmethod
+        def deferToThread(func):
+            jobs.append(func)
+            return defer.Deferred()
+
+    class FakeReactor:
+        @staticmethod
+        def callFromThread(func, *args):
+            func(*args)
+
+    monkeypatch.setattr(connections, "threads", FakeThreads)
+    monkeypatch.setattr(connections, "reactor", FakeReactor)
+    manager = DatabaseManager()
+
+    d = manager._defer_to_thread(lambda: 1)
+    d.addErrback(lambda f: None)
+    d.cancel()
+    assert manager.pending == 1
+
+    jobs[0]()
+    assert manager.pending == 0
+
+
+def test_db_pending_released_when_thread_raises(monkeypatch):
+    class FakeThreads:
+        @staticmethod
+        def deferToThread(func):
+            return defer.maybeDeferred(func)
+
+    class FakeReactor:
+        @staticmethod
+        def callFromThread(func, *args):
+            func(*args)
+
+    monkeypatch.setattr(connections, "threads", FakeThreads)
+    monkeypatch.setattr(connections, "reactor", FakeReactor)
+    manager = DatabaseManager()
+
+    def _fail():
+        raise RuntimeError("boom")
+
+    d = manager._defer_to_thread(_fail)
+    d.addErrback(lambda f: None)
+    assert manager.pending == 0